@@ -1,34 +1,130 @@
 import numpy as np
 import pandas as pd
 from emcee import autocorr
+from chunked import MEMORY_BUDGET, MAX_LAG, iter_chunks, check_budget
+from chunked import Moments, Autocorrelation
 
 Ts = ["04", "035", "03", "025", "02", "015", "01", "005", "0025"]  # , "001"]
 Ls = ["16", "24", "32", "48", "64", "96", "128", "192"]
-cut = 1000  # thermalization cut in units of MDTU
-N = 3
-G = "05"
-datarun = f"../lattice/improv_runs/bmn2_su{N}_g{G}"
-# header
-header = f"T,L,E,err,meas,freq,tau"
-with open(f"{datarun}/e.csv", "w") as f:
-    print(header, file=f)
-    for L in Ls:
-        for T in Ts:
-            filename = f"{datarun}/l{L}/t{T}/data.h5"
-            try:
-                data = pd.read_hdf(filename, "mcmc_obs")
-                data.e = data.e * float(N) ** 2
-                df = data.query("mdtu > @cut")
-                avg, std = df.e.mean(), df.e.std()
-                bins = df.shape[0]
-                # select only one saving frequency, the last one
-                freqs = df.freq.dropna().unique()
-                freq = freqs[-1]
-                energy = df.query("freq == @freq").e
-                tau = autocorr.integrated_time(energy.values, tol=0)
-                print(
-                    f"0.{T[1:]},{L},{avg:.4f},{std/np.sqrt(bins):.4f},{int(bins)},{int(freq)},{tau[0]:.2f}",
-                    file=f,
-                )
-            except (ValueError, FileNotFoundError) as e:
-                pass
+
+
+def average_run(filename: str, N: int = 3, cut: float = 1000) -> tuple:
+    """Average the energy of a single run, loading the whole chain in memory
+
+    Args:
+        filename (str): The HDF5 file with the MC trajectory
+        N (int, optional): The rank of the gauge group SU(N). Defaults to 3.
+        cut (float, optional): The thermalization cut in units of MDTU. Defaults to 1000.
+
+    Returns:
+        tuple: average, standard deviation, number of measurements, saving frequency and autocorrelation time
+    """
+    data = pd.read_hdf(filename, "mcmc_obs")
+    data.e = data.e * float(N) ** 2
+    df = data.query("mdtu > @cut")
+    avg, std = df.e.mean(), df.e.std()
+    bins = df.shape[0]
+    # select only one saving frequency, the last one
+    freqs = df.freq.dropna().unique()
+    freq = freqs[-1]
+    energy = df.query("freq == @freq").e
+    tau = autocorr.integrated_time(energy.values, tol=0)
+    return avg, std, bins, freq, tau[0]
+
+
+def reserved_memory(max_lag: int = MAX_LAG) -> int:
+    """Memory in bytes used by the accumulators of `average_run_chunked`"""
+    return Autocorrelation.memory(max_lag)
+
+
+def average_run_chunked(
+    filename: str,
+    N: int = 3,
+    cut: float = 1000,
+    memory_budget: float = MEMORY_BUDGET,
+    max_lag: int = MAX_LAG,
+) -> tuple:
+    """Same as `average_run` but reading the chain in blocks of bounded size.
+    The saving frequency used for the autocorrelation is the last one to appear, so the
+    accumulator starts again every time a new frequency shows up.
+
+    Args:
+        filename (str): The HDF5 file with the MC trajectory
+        N (int, optional): The rank of the gauge group SU(N). Defaults to 3.
+        cut (float, optional): The thermalization cut in units of MDTU. Defaults to 1000.
+        memory_budget (float, optional): The peak memory in MB. Defaults to MEMORY_BUDGET.
+        max_lag (int, optional): The largest lag of the autocorrelation function. Defaults to MAX_LAG.
+
+    Returns:
+        tuple: average, standard deviation, number of measurements, saving frequency and autocorrelation time
+    """
+    moments = Moments()
+    freqs = set()  # saving frequencies seen so far
+    freq, acf = None, None
+    reserved = reserved_memory(max_lag)
+    for data in iter_chunks(filename, memory_budget=memory_budget, reserved=reserved):
+        df = data.query("mdtu > @cut")
+        energy = df.e.values * float(N) ** 2
+        moments.update(energy)
+        for f in df.freq.dropna().unique():
+            if f not in freqs:
+                freqs.add(f)
+                freq, acf = f, Autocorrelation(max_lag)
+        if acf is not None:
+            acf.update(energy[(df.freq == freq).values])
+    if acf is None:
+        raise ValueError(f"No measurements after the thermalization cut in {filename}")
+    tau = acf.integrated_time()
+    return moments.mean, moments.std(), moments.n, freq, tau
+
+
+def average_data(
+    N: int = 3,
+    G: str = "05",
+    data_folder: str = "../lattice/improv_runs",
+    cut: float = 1000,
+    chunked: bool = False,
+    memory_budget: float = MEMORY_BUDGET,
+    max_lag: int = MAX_LAG,
+):
+    """Average the energy of each (L, T) run of a given gauge group and coupling and save it in e.csv
+
+    Args:
+        N (int, optional): The rank of the gauge group SU(N). Defaults to 3.
+        G (str, optional): The coupling as it appears in the run folder name. Defaults to "05".
+        data_folder (str, optional): The main data folder where all the different parameters were run. Defaults to "../lattice/improv_runs".
+        cut (float, optional): The thermalization cut in units of MDTU. Defaults to 1000.
+        chunked (bool, optional): Read each chain in blocks instead of loading it whole. Defaults to False.
+        memory_budget (float, optional): The peak memory in MB when chunked. Defaults to MEMORY_BUDGET.
+        max_lag (int, optional): The largest lag of the autocorrelation function when chunked. Defaults to MAX_LAG.
+    """
+    if chunked:
+        # fail here, not silently for every run in the loop below
+        if max_lag < 1:
+            raise ValueError(f"max_lag must be a positive integer, not {max_lag}")
+        check_budget(memory_budget, reserved_memory(max_lag))
+    datarun = f"{data_folder}/bmn2_su{N}_g{G}"
+    # header
+    header = f"T,L,E,err,meas,freq,tau"
+    with open(f"{datarun}/e.csv", "w") as f:
+        print(header, file=f)
+        for L in Ls:
+            for T in Ts:
+                filename = f"{datarun}/l{L}/t{T}/data.h5"
+                try:
+                    if chunked:
+                        avg, std, bins, freq, tau = average_run_chunked(
+                            filename, N, cut, memory_budget, max_lag
+                        )
+                    else:
+                        avg, std, bins, freq, tau = average_run(filename, N, cut)
+                    print(
+                        f"0.{T[1:]},{L},{avg:.4f},{std/np.sqrt(bins):.4f},{int(bins)},{int(freq)},{tau:.2f}",
+                        file=f,
+                    )
+                except (ValueError, FileNotFoundError) as e:
+                    pass
+
+
+if __name__ == "__main__":
+    average_data()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# single entry point for the analysis scripts
+# heavy dependencies (pandas, matplotlib, seaborn, gvar, lsqfit, ...) are only imported
+# by the subcommand that needs them, so `--help` and quick runs start immediately
+import os, sys
+import argparse
+from importlib import import_module
+
+
+def gather(args):
+    from gather_data import gather_data
+
+    gather_data(args.data_folder, args.run_folder, args.do_all)
+
+
+def average(args):
+    from average_data import average_data
+
+    average_data(
+        args.N,
+        args.G,
+        args.data_folder,
+        args.cut,
+        args.chunked,
+        args.memory_budget,
+        args.max_lag,
+    )
+
+
+def check_file(filename):
+    if not os.path.isfile(filename):
+        print(f"CSV file {filename} does not exist. Exiting.")
+        sys.exit()
+
+
+def fit(args):
+    check_file(args.file)
+    from fit_e_plot import fit_e_allT
+
+    fit_e_allT(args.file, args.prior, args.draft)
+
+
+def table(args):
+    check_file(args.file)
+    if not os.path.isdir(args.output):
+        print(f"Folder {args.output} does not exist. Exiting.")
+        sys.exit()
+    from table_e_latex import write_table
+
+    write_table(args.file, args.output)
+
+
+def report(args):
+    from report import make_report
+
+    make_report(args.data_folder, args.output, args.prior, args.amax, args.machine)
+
+
+def plot(args):
+    # module names with a dash can not be used in an import statement
+    if args.kind == "kde":
+        import_module("plot_e-kde_allT").main(
+            args.datafolder, args.outdir, args.outfmt, args.chunked, args.memory_budget
+        )
+    else:
+        import_module("plot_e-mdtu").main(args.datafolder, args.outdir, args.outfmt)
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def add_chunked_args(parser):
+    parser.add_argument(
+        "--chunked",
+        action="store_true",
+        help="read each chain in blocks instead of loading it whole",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=256,
+        help="peak memory in MB when chunked (blocks and accumulators). (default: %(default)s)",
+    )
+
+
+def parsing_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="bmn2", description="Analysis of lattice Monte Carlo data for BMN2"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("gather", help="collect the MC output files in HDF5")
+    p.add_argument("--data-folder", type=str, default="../lattice/improv_runs")
+    p.add_argument("--run-folder", type=str, default="bmn2_su3_g20/l128/t005")
+    p.add_argument("--do-all", action="store_true")
+    p.set_defaults(func=gather)
+
+    p = subparsers.add_parser("average", help="average the energy and save e.csv")
+    p.add_argument("--N", type=int, default=3)
+    p.add_argument("--G", type=str, default="05")
+    p.add_argument("--data-folder", type=str, default="../lattice/improv_runs")
+    p.add_argument("--cut", type=float, default=1000)
+    add_chunked_args(p)
+    p.add_argument(
+        "--max-lag",
+        type=positive_int,
+        default=10000,
+        help="largest lag of the autocorrelation function when chunked. (default: %(default)s)",
+    )
+    p.set_defaults(func=average)
+
+    p = subparsers.add_parser("fit", help="fit the energy as a function of 1/LT")
+    p.add_argument(
+        "--file", type=str, default="../lattice/improv_runs/bmn2_su3_g20/e.csv"
+    )
+    p.add_argument("--prior", nargs="+", type=float, default=[9, 9])
+    p.add_argument(
+        "--draft",
+        action="store_true",
+        help="render labels with mathtext instead of LaTeX",
+    )
+    p.set_defaults(func=fit)
+
+    p = subparsers.add_parser("table", help="write the energies as a LaTeX table")
+    p.add_argument(
+        "--file", type=str, default="../lattice/improv_runs/bmn2_su2_g05/e.csv"
+    )
+    p.add_argument("--output", type=str, default="tables")
+    p.set_defaults(func=table)
+
+    p = subparsers.add_parser(
+        "report", help="write the tables of all the ensembles in a single pass"
+    )
+    p.add_argument("--data-folder", type=str, default="../lattice/improv_runs")
+    p.add_argument("--output", type=str, default="tables")
+    p.add_argument("--prior", nargs="+", type=float, default=[9, 9])
+    p.add_argument(
+        "--amax",
+        type=float,
+        default=0.3,
+        help="cut in 1/LT of the fits in the summary table, one of the cuts of the fit scan. (default: %(default)s)",
+    )
+    p.add_argument(
+        "--machine",
+        nargs="*",
+        choices=["csv", "json"],
+        default=[],
+        help="also save the data of the tables in these formats",
+    )
+    p.set_defaults(func=report)
+
+    p = subparsers.add_parser("plot", help="plot the energy distributions")
+    kinds = p.add_subparsers(dest="kind", required=True)
+    kde = kinds.add_parser("kde", help="energy distribution at all temperatures")
+    mdtu = kinds.add_parser("mdtu", help="energy along the MC trajectory of each run")
+    for k in [kde, mdtu]:
+        k.add_argument(
+            "--datafolder", type=str, default="../lattice/improv_runs/bmn2_su3_g05"
+        )
+        k.add_argument("--outdir", type=str, default="figures")
+        k.add_argument("--outfmt", type=str, default="svg")
+        k.set_defaults(func=plot)
+    # the trajectory plot needs the whole chain, only the KDE can be done in blocks
+    add_chunked_args(kde)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parsing_args()
+    args.func(args)
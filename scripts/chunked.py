@@ -0,0 +1,231 @@
+# out-of-core helpers to process a trajectory store (data.h5) in blocks of bounded size
+# the partial results of each block are combined exactly, so the final numbers do not
+# depend on the block size and the memory used does not depend on the chain length
+import warnings
+import numpy as np
+import pandas as pd
+
+MEMORY_BUDGET = 256  # default peak memory of the analysis of one store in MB
+MAX_LAG = 10000  # default largest lag of the autocorrelation function
+# a block is held together with the copy made while reading it and a filtered copy,
+# plus a few float arrays (masks, rescaled and shifted values) for each row
+BLOCK_COPIES = 3
+ROW_OVERHEAD = 256  # bytes
+
+
+def check_budget(memory_budget: float, reserved: float):
+    """Make sure that the memory budget leaves some room for the blocks after the accumulators
+
+    Args:
+        memory_budget (float): The peak memory in MB
+        reserved (float): The memory in bytes used by the accumulators
+    """
+    if memory_budget * 2**20 <= reserved:
+        raise ValueError(
+            f"A memory budget of {memory_budget} MB is too small: the accumulators need {reserved / 2**20:.1f} MB"
+        )
+
+
+def chunk_rows(
+    filename: str,
+    key: str = "mcmc_obs",
+    memory_budget: float = MEMORY_BUDGET,
+    reserved: float = 0,
+) -> int:
+    """Estimate how many rows of a store can be processed at once within the memory budget.
+    The size of a row is measured on a small probe and it is multiplied by the number of
+    copies of a block alive at the same time.
+
+    Args:
+        filename (str): The HDF5 file with the MC trajectory
+        key (str, optional): The key of the dataframe in the file. Defaults to "mcmc_obs".
+        memory_budget (float, optional): The peak memory in MB. Defaults to MEMORY_BUDGET.
+        reserved (float, optional): The memory in bytes used by the accumulators, which is not available for the blocks. Defaults to 0.
+
+    Returns:
+        int: the number of rows in one block
+    """
+    check_budget(memory_budget, reserved)
+    available = memory_budget * 2**20 - reserved
+    probe = pd.read_hdf(filename, key, start=0, stop=1000)
+    if probe.shape[0] == 0:
+        return 1
+    row_bytes = probe.memory_usage(deep=True).sum() / probe.shape[0]
+    return max(1, int(available / (BLOCK_COPIES * row_bytes + ROW_OVERHEAD)))
+
+
+def iter_chunks(
+    filename: str,
+    key: str = "mcmc_obs",
+    memory_budget: float = MEMORY_BUDGET,
+    reserved: float = 0,
+):
+    """Read a store written by gather_data.py one block at a time (works for both fixed and table format)
+
+    Args:
+        filename (str): The HDF5 file with the MC trajectory
+        key (str, optional): The key of the dataframe in the file. Defaults to "mcmc_obs".
+        memory_budget (float, optional): The peak memory in MB. Defaults to MEMORY_BUDGET.
+        reserved (float, optional): The memory in bytes used by the accumulators. Defaults to 0.
+
+    Yields:
+        pd.DataFrame: consecutive blocks of trajectories, in the order they are stored
+    """
+    rows = chunk_rows(filename, key, memory_budget, reserved)
+    start = 0
+    while True:
+        chunk = pd.read_hdf(filename, key, start=start, stop=start + rows)
+        if chunk.shape[0] == 0:
+            return
+        yield chunk
+        start += rows
+
+
+class Moments:
+    """Running count, mean, variance, minimum and maximum of a series seen in blocks.
+    Blocks are merged with the pairwise update of Chan et al., which is exact and stable.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        n = x.size
+        if n == 0:
+            return
+        mean = x.mean()
+        m2 = ((x - mean) ** 2).sum()
+        delta = mean - self.mean
+        total = self.n + n
+        self.mean += delta * n / total
+        self.m2 += m2 + delta**2 * self.n * n / total
+        self.n = total
+        self.min = min(self.min, x.min())
+        self.max = max(self.max, x.max())
+
+    def std(self, ddof: int = 1) -> float:
+        """Standard deviation (with the same default ddof as pandas)"""
+        if self.n <= ddof:
+            return np.nan
+        return np.sqrt(self.m2 / (self.n - ddof))
+
+
+class Histogram:
+    """Histogram with fixed edges accumulated over blocks"""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(self.edges.size - 1, dtype=np.int64)
+
+    def update(self, x):
+        self.counts += np.histogram(x, bins=self.edges)[0]
+
+    @property
+    def centers(self):
+        return 0.5 * (self.edges[1:] + self.edges[:-1])
+
+
+def _lag_sums(y, max_lag: int):
+    """Sums of y[t] * y[t + k] for k < max_lag, using a zero-padded FFT"""
+    sums = np.zeros(max_lag)
+    if y.size == 0:
+        return sums
+    n = 2 ** int(np.ceil(np.log2(2 * y.size)))
+    f = np.fft.rfft(y, n=n)
+    acf = np.fft.irfft(f * np.conjugate(f), n=n)[: min(max_lag, y.size)]
+    sums[: acf.size] = acf
+    return sums
+
+
+class Autocorrelation:
+    """Autocorrelation function of a series seen in blocks, up to a maximum lag.
+
+    The lag products are accumulated on sub-blocks of `max_lag` values plus the last
+    `max_lag - 1` values of the previous ones, so every pair (t, t + k) is counted exactly
+    once and the FFT buffers do not grow with the size of the blocks read from disk.
+    The mean is subtracted at the end using the sums of the first and last values,
+    which gives the same normalized function as `emcee.autocorr.function_1d`.
+    """
+
+    def __init__(self, max_lag: int = MAX_LAG):
+        if max_lag < 1:
+            raise ValueError(f"max_lag must be a positive integer, not {max_lag}")
+        self.max_lag = max_lag
+        self.n = 0
+        self.shift = None  # reduces the cancellation when the mean is removed
+        self.total = 0.0
+        self.head = np.zeros(0)
+        self.tail = np.zeros(0)
+        self.sums = np.zeros(max_lag)
+
+    @staticmethod
+    def memory(max_lag: int = MAX_LAG) -> int:
+        """Upper bound in bytes of the memory used by one instance, FFT buffers included
+
+        Args:
+            max_lag (int, optional): The largest lag of the autocorrelation function. Defaults to MAX_LAG.
+
+        Returns:
+            int: the number of bytes
+        """
+        # a sub-block and the tail are padded to at most 8 max_lag points and the FFT
+        # needs 4 arrays of that size; the state is made of 3 arrays of max_lag values
+        return 8 * (4 * 8 * max_lag + 3 * max_lag)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        if x.size == 0:
+            return
+        if self.shift is None:
+            self.shift = x.mean()
+        for start in range(0, x.size, self.max_lag):
+            self._update(x[start : start + self.max_lag] - self.shift)
+
+    def _update(self, y):
+        z = np.concatenate([self.tail, y])
+        self.sums += _lag_sums(z, self.max_lag) - _lag_sums(self.tail, self.max_lag)
+        if self.head.size < self.max_lag:
+            self.head = np.concatenate([self.head, y[: self.max_lag - self.head.size]])
+        self.tail = z[-(self.max_lag - 1) :] if self.max_lag > 1 else z[:0]
+        self.total += y.sum()
+        self.n += y.size
+
+    def function(self):
+        """Normalized autocorrelation function for lags k < min(n, max_lag)"""
+        lags = min(self.n, self.max_lag)
+        k = np.arange(lags)
+        mu = self.total / self.n
+        # sums of y[t] for t < n - k and for t >= k
+        last = np.concatenate([[0.0], np.cumsum(self.tail[::-1])])
+        first = np.concatenate([[0.0], np.cumsum(self.head)])
+        cov = (
+            self.sums[:lags]
+            - mu * (2 * self.total - last[:lags] - first[:lags])
+            + (self.n - k) * mu**2
+        )
+        return cov / cov[0]
+
+    def integrated_time(self, c: float = 5) -> float:
+        """Integrated autocorrelation time with the automated window of `emcee.autocorr.integrated_time`
+
+        Args:
+            c (float, optional): The step size for the window search. Defaults to 5.
+
+        Returns:
+            float: the integrated autocorrelation time
+        """
+        taus = 2.0 * np.cumsum(self.function()) - 1.0
+        m = np.arange(taus.size) < c * taus
+        if np.any(~m):
+            return taus[np.argmin(m)]
+        if self.n > self.max_lag:
+            warnings.warn(
+                f"The window for the autocorrelation time was not found within {self.max_lag} lags: "
+                "the result is a lower bound, increase max_lag."
+            )
+        return taus[-1]
@@ -0,0 +1,76 @@
+# fits of the energy as a polynomial in 1/LT (no plotting, so it is cheap to import)
+from tabulate import tabulate
+import gvar as gv
+import lsqfit as ls
+import numpy as np
+
+CUTS = [0.05, 0.1, 0.2, 0.3, 0.4, 0.5]  # cuts in 1/LT
+ORDERS = [1, 2, 3]  # orders of the polynomial in 1/LT
+
+
+def make_data(data, cut=0.45):
+    df = data.query("`1/LT` < @cut")  # .drop_duplicates(subset="1/LT")
+    x = df["1/LT"].values
+    y = df["E"].values
+    yerr = df["err"].values
+    return x, gv.gvar(y, yerr)
+
+
+def fcn(x, p):  # order determined by size of p[a]
+    c = p["a"]  # array of coefficients for the polynomial of x
+    E = p["E"]  # bias, term at x=0
+    return np.dot(np.vander(x, len(c) + 1)[:, :-1], c) + E
+
+
+def make_prior(order, E):
+    prior = gv.BufferDict()  # any dictionary works
+    prior["a"] = [gv.gvar(0, 100) for i in range(order)]
+    prior["E"] = gv.gvar(E[0], E[1])
+    return prior
+
+
+def make_fit(data, Ep, po, cut):
+    prior = make_prior(po, Ep)
+    datagv = make_data(data, cut)
+    fit = ls.nonlinear_fit(data=datagv, fcn=fcn, prior=prior)
+    print(fit)
+    return fit
+
+
+def fit_scan(data, e_prior, cuts=CUTS, orders=ORDERS):
+    """Fit the energy as a polynomial in 1/LT for each cut in 1/LT and each polynomial order
+
+    Args:
+        data (pandas.DataFrame): The averaged energies as read from e.csv
+        e_prior (list): The mean and width of the prior on the energy
+        cuts (list, optional): The cuts in 1/LT. Defaults to CUTS.
+        orders (list, optional): The orders of the polynomial. Defaults to ORDERS.
+
+    Returns:
+        list: one row [cut, order, E, chi2/dof] for each fit
+    """
+    data = data.assign(**{"1/LT": 1.0 / (data["L"] * data["T"])})
+    results = []
+    for cut in cuts:
+        for po in orders:
+            print(f"************************************* cut= {cut} order = {po}")
+            fit = make_fit(data, e_prior, po, cut)
+            results.append([cut, po, fit.p["E"], fit.chi2 / fit.dof])
+    return results
+
+
+def fit_table(results):
+    """Format the results of `fit_scan` as a LaTeX table
+
+    Args:
+        results (list): The rows returned by `fit_scan`
+
+    Returns:
+        str: the table in LaTeX format
+    """
+    return tabulate(
+        results,
+        headers=["$a_\\textrm{max}$", "$n_p$", "E", "$\\chi^2$/dof"],
+        floatfmt=".2f",
+        tablefmt="latex_raw",
+    )
@@ -1,46 +1,22 @@
 # fit and plot
 import pandas as pd
-from tabulate import tabulate
 import gvar as gv
-import lsqfit as ls
-import numpy as np
 import os, sys, argparse
 import matplotlib
+from fit_e import fit_scan, fit_table
 
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
-plt.rc("text", usetex=True)
-plt.style.use("figures/paper.mplstyle")
 
+def set_style(draft=False):
+    """Set the plotting style for the fit figures.
 
-def make_data(data, cut=0.45):
-    df = data.query("`1/LT` < @cut")  # .drop_duplicates(subset="1/LT")
-    x = df["1/LT"].values
-    y = df["E"].values
-    yerr = df["err"].values
-    return x, gv.gvar(y, yerr)
-
-
-def fcn(x, p):  # order determined by size of p[a]
-    c = p["a"]  # array of coefficients for the polynomial of x
-    E = p["E"]  # bias, term at x=0
-    return np.dot(np.vander(x, len(c) + 1)[:, :-1], c) + E
-
-
-def make_prior(order, E):
-    prior = gv.BufferDict()  # any dictionary works
-    prior["a"] = [gv.gvar(0, 100) for i in range(order)]
-    prior["E"] = gv.gvar(E[0], E[1])
-    return prior
-
-
-def make_fit(data, Ep, po, cut):
-    prior = make_prior(po, Ep)
-    datagv = make_data(data, cut)
-    fit = ls.nonlinear_fit(data=datagv, fcn=fcn, prior=prior)
-    print(fit)
-    return fit
+    Args:
+        draft (bool, optional): Render labels with mathtext instead of spawning LaTeX (much faster, for quick looks). Defaults to False.
+    """
+    plt.rc("text", usetex=not draft)
+    plt.style.use("figures/paper.mplstyle")
 
 
 def parsing_args():
@@ -60,6 +36,11 @@ def parsing_args():
         default=[9, 9],
         help="Energy prior. (default: %(default)s)",
     )
+    parser.add_argument(
+        "--draft",
+        action="store_true",
+        help="render labels with mathtext instead of LaTeX. (default: %(default)s)",
+    )
     args = parser.parse_args()
     print("Arguments passed")
     print(args)
@@ -71,7 +52,7 @@ def parsing_args():
         print("CSV file {} does not exist. Exiting.".format(filename))
         sys.exit()
 
-    return filename, e_prior  # , a_max
+    return filename, e_prior, args.draft  # , a_max
 
 
 def plot_results(results, e_lim, figname):
@@ -102,7 +83,7 @@ def plot_results(results, e_lim, figname):
     ax2.axhline(1.0, color="black", linestyle="--")
     ax1.set_ylabel(r"$E_0$")
     ax2.set_ylabel(r"$\chi^{2}$/dof")
-    ax2.set_xlabel(r"$a_\textrm{max}$")
+    ax2.set_xlabel(r"$a_\mathrm{max}$")
     #    ax1.set_title(r"SU(3) $\lambda=2.0$")
     ax1.legend(loc="upper right")
     figname = figname.split("/")[-2]
@@ -112,37 +93,33 @@ def plot_results(results, e_lim, figname):
     plt.close(fig)
 
 
-if __name__ == "__main__":
+def fit_e_allT(filename, e_prior, draft=False):
     """Make fits of 1/LT function for each cut in 1/LT and for different polynomial orders.
-    Plot the results in a PDF.
+    Save the results in a LaTeX table and plot them in a PDF.
+
+    Args:
+        filename (str): The CSV file with the averaged energies (e.csv)
+        e_prior (list): The mean and width of the prior on the energy
+        draft (bool, optional): Render labels with mathtext instead of LaTeX. Defaults to False.
     """
-    filename, e_prior = parsing_args()
+    set_style(draft)
     data = pd.read_csv(filename, sep=",", header=0, dtype=float)
-    data["1/LT"] = 1.0 / (data["L"] * data["T"])
-    results = []
-    for cut in [0.05, 0.1, 0.2, 0.3, 0.4, 0.5]:
-        for po in [1, 2, 3]:
-            print(f"************************************* cut= {cut} order = {po}")
-            fit = make_fit(data, e_prior, po, cut)
-            results.append([cut, po, fit.p["E"], fit.chi2 / fit.dof])
+    results = fit_scan(data, e_prior)
+    fit_E = results[-1][2]
 
     # saving table
     outfilename = filename.split("/")[-2]
     outfile = f"tables/{outfilename}_fit_e_allT.tex"
     print(f"Saving to {outfile}")
     with open(outfile, "w") as f:
-        print(
-            tabulate(
-                results,
-                headers=["$a_\\textrm{max}$", "$n_p$", "E", "$\chi^2$/dof"],
-                floatfmt=".2f",
-                tablefmt="latex_raw",
-            ),
-            file=f,
-        )
+        print(fit_table(results), file=f)
     # plotting limits are given automatically by 10\sigma
     e_lims = [
-        fit.p["E"].mean - 10 * fit.p["E"].sdev,
-        fit.p["E"].mean + 10 * fit.p["E"].sdev,
+        fit_E.mean - 10 * fit_E.sdev,
+        fit_E.mean + 10 * fit_E.sdev,
     ]
     plot_results(results, e_lims, filename)
+
+
+if __name__ == "__main__":
+    fit_e_allT(*parsing_args())
@@ -4,36 +4,75 @@ import seaborn as sns
 from pathlib import Path
 import fire
 import matplotlib.pyplot as plt
+from chunked import MEMORY_BUDGET, iter_chunks, Moments, Histogram
 
 sns.set_theme(style="white", rc={"axes.facecolor": (0, 0, 0, 0)})
 sns.set_context("poster")  # scale elements up or down in size
 
 
+def histogram_run(filename: str, bins: int = 512, memory_budget: float = MEMORY_BUDGET):
+    """Histogram the energy of a single run reading the chain in blocks of bounded size.
+    The first pass finds the range and the second one fills the bins.
+
+    Args:
+        filename (str): The HDF5 file with the MC trajectory
+        bins (int, optional): The number of bins. Defaults to 512.
+        memory_budget (float, optional): The peak memory in MB. Defaults to MEMORY_BUDGET.
+
+    Returns:
+        tuple: temperature, centers of the bins and counts
+    """
+    moments = Moments()
+    for data in iter_chunks(filename, memory_budget=memory_budget):
+        moments.update(data.e.values)
+        temperature = data.temperature.values[0]
+    if moments.n == 0:
+        raise ValueError(f"No data in {filename}")
+    hist = Histogram(np.linspace(moments.min, moments.max, bins + 1))
+    for data in iter_chunks(filename, memory_budget=memory_budget):
+        hist.update(data.e.values)
+    return temperature, hist.centers, hist.counts
+
+
 def make_kde_plot(
     Nt: str,
     Ts: list = ["04", "035", "03", "025", "02", "015", "01", "005", "0025"],
     run: str = "../lattice/improv_runs/bmn2_su3_g05",
     outputdir: str = "figures",
     outputfmt: str = "svg",
+    chunked: bool = False,
+    memory_budget: float = MEMORY_BUDGET,
 ):
     # list where we save the energy of each temperature
     energies = []
     # list where we save the temperatures
     temperatures = []
+    # list where we save the weight of each energy (histogram counts when chunked)
+    weights = []
     # loop over temperatures
     for T in Ts:
         try:
             filename = f"{run}/l{Nt}/t{T}/data.h5"
-            data = pd.read_hdf(filename, "mcmc_obs")
-            # append to lists
-            energies.append(data.e.values)
-            temperatures.append(data.temperature.values)
+            if chunked:
+                t, centers, counts = histogram_run(
+                    filename, memory_budget=memory_budget
+                )
+                energies.append(centers)
+                temperatures.append(np.full(centers.shape, t))
+                weights.append(counts)
+            else:
+                data = pd.read_hdf(filename, "mcmc_obs")
+                # append to lists
+                energies.append(data.e.values)
+                temperatures.append(data.temperature.values)
         except (ValueError, FileNotFoundError) as e:
             print(f"{e} . Skipping...")
     energies = np.concatenate(energies, axis=None)
     temperatures = np.concatenate(temperatures, axis=None)
     assert energies.shape == temperatures.shape
     df = pd.DataFrame(dict(t=temperatures, e=energies))
+    if chunked:
+        df["w"] = np.concatenate(weights, axis=None)
     t_order = list(df.t.unique())
     # Initialize the FacetGrid object
     pal = sns.cubehelix_palette(len(Ts), rot=-0.25, light=0.7)
@@ -41,17 +80,23 @@ def make_kde_plot(
         df, row="t", hue="t", hue_order=t_order, aspect=10, height=0.6, palette=pal
     )
 
+    def kde(data, **kwargs):
+        # the effective size of histogram weights is much smaller than the number of
+        # measurements: use Scott's rule with the latter, as for the full chain
+        if chunked:
+            kwargs.update(weights="w", bw_method=data.w.sum() ** (-1 / 5))
+        sns.kdeplot(data=data, x="e", **kwargs)
+
     # Draw the densities in a few steps
-    g.map(
-        sns.kdeplot,
-        "e",
+    g.map_dataframe(
+        kde,
         bw_adjust=0.5,
         clip_on=False,
         fill=True,
         alpha=1,
         linewidth=1.5,
     )
-    g.map(sns.kdeplot, "e", clip_on=False, color="w", lw=2, bw_adjust=0.5)
+    g.map_dataframe(kde, clip_on=False, color="w", lw=2, bw_adjust=0.5)
     g.map(plt.axhline, y=0, lw=2, clip_on=False)
 
     # Define and use a simple function to label the plot in axes coordinates
@@ -88,6 +133,8 @@ def main(
     datafolder: str = "../lattice/improv_runs/bmn2_su3_g05",
     outdir: str = "figures",
     outfmt: str = "svg",
+    chunked: bool = False,
+    memory_budget: float = MEMORY_BUDGET,
 ):
     """Main function which will generate plots for all the parameters in the data folder.
 
@@ -95,12 +142,21 @@ def main(
         datafolder (str, optional): The folder for a specific lattice coupling and gauge group. Defaults to "../lattice/improv_runs/bmn2_su3_g05".
         outdir (str, optional): The folder where we want to save the figures. Defaults to "figures".
         outfmt (str, optional): The format of the files (defines the filename extension). Defaults to "svg".
+        chunked (bool, optional): Histogram each chain in blocks instead of loading all of them in memory. Defaults to False.
+        memory_budget (float, optional): The peak memory in MB when chunked. Defaults to MEMORY_BUDGET.
     """
     # possible n_t
     Ls = ["16", "24", "32", "48", "64", "96", "128", "192"]
     for Nt in Ls:
         print(f"L={float(Nt)}")
-        make_kde_plot(Nt, run=datafolder, outputdir=outdir, outputfmt=outfmt)
+        make_kde_plot(
+            Nt,
+            run=datafolder,
+            outputdir=outdir,
+            outputfmt=outfmt,
+            chunked=chunked,
+            memory_budget=memory_budget,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+# write all the tables for every (N, g) ensemble in a single pass
+# the averaged energies are loaded once, the fits are done once, and all the tables
+# (per-ensemble, fit-scan and cross-coupling summary) are formatted from the same data
+import re
+import pandas as pd
+import gvar as gv
+from pathlib import Path
+from tabulate import tabulate
+import fire
+from table_e_latex import energy_table
+from fit_e import CUTS, fit_scan, fit_table
+
+
+def load_ensembles(data_folder: str = "../lattice/improv_runs") -> pd.DataFrame:
+    """Read the e.csv files of all the ensembles in the data folder into a single dataframe
+
+    Args:
+        data_folder (str, optional): The main data folder where all the different parameters were run. Defaults to "../lattice/improv_runs".
+
+    Returns:
+        pd.DataFrame: the averaged energies with additional columns for the run name, gauge group and coupling
+    """
+    frames = []
+    for efile in sorted(Path(data_folder).glob("bmn2_su*_g*/e.csv")):
+        run = efile.parent.name
+        match = re.fullmatch(r"bmn2_su(\d+)_g(\d+)", run)
+        if match is None:
+            print(f"{run} is not an ensemble name. Skipping...")
+            continue
+        N, g = match.groups()
+        data = pd.read_csv(efile)
+        data.insert(0, "run", run)
+        data.insert(1, "N", int(N))
+        data.insert(2, "g", float(f"{g[0]}.{g[1:]}"))
+        frames.append(data)
+    assert len(frames) > 0, f"No e.csv files found in {data_folder}"
+    return pd.concat(frames, ignore_index=True)
+
+
+def summary_table(fits: pd.DataFrame, amax: float) -> pd.DataFrame:
+    """Collect the extrapolated energy of every ensemble for each polynomial order at a fixed cut
+
+    Args:
+        fits (pd.DataFrame): The fit results of all the ensembles
+        amax (float): The cut in 1/LT of the fits reported
+
+    Returns:
+        pd.DataFrame: one row for each ensemble and one column for each polynomial order
+    """
+    summary = fits[fits.cut == amax].pivot(index=["N", "g"], columns="n_p", values="E")
+    return summary.rename(columns=lambda o: f"$n_p$={o}").reset_index()
+
+
+def make_report(
+    data_folder: str = "../lattice/improv_runs",
+    outputdir: str = "tables",
+    prior: list = [9, 9],
+    amax: float = 0.3,
+    machine: list = [],
+):
+    """Write the LaTeX tables of all the ensembles, of their fits in 1/LT and a summary across couplings
+
+    Args:
+        data_folder (str, optional): The main data folder where all the different parameters were run. Defaults to "../lattice/improv_runs".
+        outputdir (str, optional): The folder where we want to save the tables. Defaults to "tables".
+        prior (list, optional): The mean and width of the prior on the energy for the fits. Defaults to [9, 9].
+        amax (float, optional): The cut in 1/LT of the fits in the summary table, one of CUTS. Defaults to 0.3.
+        machine (list, optional): Also save the data of the tables in these formats ("csv" and/or "json"). Defaults to [].
+    """
+    if amax not in CUTS:
+        # fail before doing any fit
+        raise ValueError(f"No fits with a_max={amax}: choose one of {CUTS}")
+    data = load_ensembles(data_folder)
+    fits = []
+    for run, df in data.groupby("run", sort=False):
+        print(f"- ensemble {run} with {df.shape[0]} points")
+        outfile = f"{outputdir}/{run}_e.tex"
+        with open(outfile, "w") as f:
+            print(energy_table(df), file=f)
+        results = fit_scan(df, prior)
+        outfile = f"{outputdir}/{run}_fit_e_allT.tex"
+        with open(outfile, "w") as f:
+            print(fit_table(results), file=f)
+        results = pd.DataFrame(results, columns=["cut", "n_p", "E", "rchisq"])
+        results.insert(0, "run", run)
+        results.insert(1, "N", df.N.iloc[0])
+        results.insert(2, "g", df.g.iloc[0])
+        fits.append(results)
+    fits = pd.concat(fits, ignore_index=True)
+    summary = summary_table(fits, amax)
+    outfile = f"{outputdir}/bmn2_fit_e_summary.tex"
+    with open(outfile, "w") as f:
+        print(
+            tabulate(
+                summary.values,
+                headers=["$N$", "$\\lambda$"] + list(summary.columns[2:]),
+                floatfmt=".1f",
+                tablefmt="latex_raw",
+            ),
+            file=f,
+        )
+    print(f"Saved {2 * data.run.nunique() + 1} tables in {outputdir}")
+    if isinstance(machine, str):
+        machine = [machine]
+    if len(machine) == 0:
+        return
+    # split the gvars in mean and error for the machine readable formats
+    err = gv.sdev(fits.E.values)
+    fits = fits.assign(E=gv.mean(fits.E.values))
+    fits.insert(fits.columns.get_loc("E") + 1, "err", err)
+    summary = fits[fits.cut == amax]
+    for fmt in machine:
+        for name, df in [("e", data), ("fit_e_allT", fits), ("fit_e_summary", summary)]:
+            outfile = f"{outputdir}/bmn2_{name}.{fmt}"
+            if fmt == "csv":
+                df.to_csv(outfile, index=False)
+            elif fmt == "json":
+                df.to_json(outfile, orient="records", indent=1)
+            else:
+                raise ValueError(f"Unknown format {fmt}")
+            print(f"-- file saved in {outfile}")
+
+
+if __name__ == "__main__":
+    fire.Fire(make_report)
@@ -5,16 +5,30 @@ import gvar as gv
 import os, sys, argparse
 
 
-def gvarfromrow(row):
-    """Generate a gvar class from the elements of a dataframe rows
+def energy_table(data):
+    """Format the averaged energies of one ensemble as a LaTeX table
 
     Args:
-        row (pandas.DataFrame): a row from df.iterrows() for example:
+        data (pandas.DataFrame): The averaged energies as read from e.csv
 
     Returns:
-        gvar.gvar: a gvar object with mean and standard deviation (useful for pretty printing and fitting)
+        str: the table in LaTeX format
     """
-    return gv.gvar(row.E, row.err)
+    # the gvars of the whole column are built at once (useful for pretty printing)
+    data = data.assign(egv=list(gv.gvar(data.E.values, data.err.values)))
+    return tabulate(
+        data[["T", "L", "egv", "meas", "freq", "tau"]].values,
+        headers=[
+            "$T$",
+            "$n_t$",
+            "E",
+            "$N_\\textrm{cfgs}$",
+            "$N_\\textrm{drop}$",
+            "$\\tau$",
+        ],
+        floatfmt=".3f",
+        tablefmt="latex_raw",
+    )
 
 
 def parsing_args():
@@ -49,31 +63,22 @@ def parsing_args():
     return filename, folder
 
 
-if __name__ == "__main__":
-    filename, outfolder = parsing_args()
-    data = pd.read_csv(filename)
+def write_table(filename, outfolder="tables"):
+    """Write the energies of one ensemble as a LaTeX table
 
-    # make new column
-    data["egv"] = data.apply(gvarfromrow, axis=1)
+    Args:
+        filename (str): The CSV file with the averaged energies (e.csv)
+        outfolder (str, optional): The folder where the TEX table is saved. Defaults to "tables".
+    """
+    data = pd.read_csv(filename)
 
     # print out table with header line
     outfilename = filename.split("/")[-2]
     outfile = f"{outfolder}/{outfilename}_e.tex"
     print(f"Saving to {outfile}")
     with open(outfile, "w") as f:
-        print(
-            tabulate(
-                data[["T", "L", "egv", "meas", "freq", "tau"]].values,
-                headers=[
-                    "$T$",
-                    "$n_t$",
-                    "E",
-                    "$N_\\textrm{cfgs}$",
-                    "$N_\\textrm{drop}$",
-                    "$\\tau$",
-                ],
-                floatfmt=".3f",
-                tablefmt="latex_raw",
-            ),
-            file=f,
-        )
+        print(energy_table(data), file=f)
+
+
+if __name__ == "__main__":
+    write_table(*parsing_args())